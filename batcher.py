@@ -0,0 +1,181 @@
+import queue
+import threading
+import time
+from collections import deque
+from message import Message, MessageBatch
+
+"""
+Accumulates Messages submitted from many threads into MessageBatches
+"""
+
+
+class MicroBatcher:
+    """builds MessageBatches from messages submitted by many threads
+
+    a batch is emitted when it holds max_count messages, when adding the
+    next message would exceed max_bytes of serialized data, or when its
+    first message has waited max_linger seconds. max_bytes is an estimate
+    from the sum of the utf-8 encoded message sizes, it leaves out the
+    batch envelope.
+
+    at most max_pending messages are held, submit() blocks or raises
+    queue.Full beyond that.
+
+    batcher = MicroBatcher(max_count=100, max_linger=0.05)
+    # producers
+    batcher.submit(msg)
+    # consumer
+    while True:
+        batch = batcher.get()
+        if batch is None:
+            break   # closed and drained
+    """
+    def __init__(self, max_count=100, max_bytes=None, max_linger=0.1, max_pending=10000):
+        if max_count <= 0:
+            raise ValueError("max_count must be positive: {}".format(max_count))
+        if max_pending < max_count:
+            raise ValueError("max_pending {} is less than max_count {}".format(max_pending, max_count))
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.max_linger = max_linger
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._not_empty = threading.Condition(self._lock)
+        self._ready = deque()
+        self._pending = 0
+        self._closed = False
+        self._start_batch()
+
+        self.batches = 0
+        self.messages = 0
+        self._fill_total = 0.0
+        self._linger_total = 0.0
+        self._submit_wait_total = 0.0
+
+    def _start_batch(self):
+        self._batch = MessageBatch()
+        self._batch_bytes = 0
+        self._batch_started = None
+
+    def _seal(self):
+        """move the batch being built to the ready queue, lock must be held"""
+        batch = self._batch
+        self.batches += 1
+        self._fill_total += len(batch) / self.max_count
+        self._linger_total += time.monotonic() - self._batch_started
+        self._ready.append(batch)
+        self._start_batch()
+        self._not_empty.notify()
+
+    def _lingered(self):
+        return (self._batch_started is not None
+                and time.monotonic() - self._batch_started >= self.max_linger)
+
+    def submit(self, msg, block=True, timeout=None, size=None):
+        """add a message, waits for room if block is true.
+        raises queue.Full if there's no room
+
+        size: serialized size of msg in bytes, if the caller already has
+        it. otherwise msg is serialized once more to measure it when
+        max_bytes is set
+        """
+        if not isinstance(msg, Message):
+            raise TypeError("{} is not Message".format(type(msg)))
+        if self.max_bytes is None:
+            size = 0
+        elif size is None:
+            size = msg.serialize_into(bytearray())
+
+        with self._not_full:
+            if self._closed:
+                raise ValueError("submit to closed batcher")
+            if self._pending >= self.max_pending:
+                if not block:
+                    raise queue.Full
+                start = time.monotonic()
+                if not self._not_full.wait_for(
+                        lambda: self._pending < self.max_pending or self._closed, timeout):
+                    self._submit_wait_total += time.monotonic() - start
+                    raise queue.Full
+                self._submit_wait_total += time.monotonic() - start
+                if self._closed:
+                    raise ValueError("submit to closed batcher")
+
+            if (self.max_bytes is not None and len(self._batch)
+                    and self._batch_bytes + size > self.max_bytes):
+                self._seal()
+            if self._batch_started is None:
+                self._batch_started = time.monotonic()
+                # waiting consumers need to start the linger timer
+                self._not_empty.notify_all()
+            self._batch.push_back(msg)
+            self._batch_bytes += size
+            self._pending += 1
+            self.messages += 1
+            if len(self._batch) >= self.max_count or self._lingered():
+                self._seal()
+
+    def _pop_ready(self):
+        batch = self._ready.popleft()
+        self._pending -= len(batch)
+        self._not_full.notify_all()
+        return batch
+
+    def get(self, block=True, timeout=None):
+        """returns the next batch, a partial batch once max_linger expired.
+        raises queue.Empty if no batch is available in time, returns None
+        once the batcher is closed and drained
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._not_empty:
+            while True:
+                if self._lingered():
+                    self._seal()
+                if self._ready:
+                    return self._pop_ready()
+                if self._closed:
+                    return None
+                if not block:
+                    raise queue.Empty
+
+                wait = None
+                if self._batch_started is not None:
+                    wait = self._batch_started + self.max_linger - time.monotonic()
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._not_empty.wait(wait)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def flush(self):
+        """emit the batch being built right away"""
+        with self._lock:
+            if len(self._batch):
+                self._seal()
+
+    def close(self):
+        """emit the remaining messages and stop accepting new ones"""
+        with self._lock:
+            if len(self._batch):
+                self._seal()
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def stats(self):
+        with self._lock:
+            batches = self.batches or 1
+            return {
+                'batches': self.batches,
+                'messages': self.messages,
+                'pending': self._pending,
+                'avg_fill': self._fill_total / batches,
+                'avg_linger': self._linger_total / batches,
+                'submit_wait': self._submit_wait_total,
+            }
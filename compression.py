@@ -0,0 +1,226 @@
+import bz2
+import inspect
+import lzma
+import struct
+import zlib
+
+"""
+Self-describing compressed frames for serialized payloads
+
+A frame is a small header followed by the compressed bytes:
+
+    MAGIC (3 bytes) | codec (1 byte) | dictionary id (4 bytes) | data
+
+json text never starts with MAGIC, so deserialize() can tell compressed
+input apart from plain input.
+
+zlib frames use a preset dictionary of class and field names, by default
+the fixed DEFAULT_DICTIONARY built from events.py. A custom one made with
+build_dictionary() has to be registered with register_dictionary() on
+every receiver. lzma and bz2 don't support preset dictionaries.
+"""
+
+MAGIC = b'\x1fSE'
+
+ZLIB = 'zlib'
+LZMA = 'lzma'
+BZ2 = 'bz2'
+
+_codec_ids = {ZLIB: 1, LZMA: 2, BZ2: 3}
+_codec_names = {v: k for k, v in _codec_ids.items()}
+_header = struct.Struct('>3sBI')
+
+# keys every serialized Message / MessageBatch carries
+_common_keys = ['args', 'kwargs', 'klass', 'id', 'events', 'messages',
+                'eventType', 'beginTimestamp', 'endTimestamp']
+
+# dictionary id -> dictionary
+_dictionaries = {}
+
+
+def _make_dictionary(names, fields, common_keys):
+    # zlib favours the end of the dictionary, so put the most common
+    # strings last
+    parts = ['"klass": "{}"'.format(n) for n in sorted(names)]
+    parts += ['"{}": '.format(f) for f in sorted(set(fields) - set(common_keys))]
+    parts += ['"{}": '.format(f) for f in common_keys]
+    zdict = ', '.join(parts).encode('utf-8')
+    return zdict[-32768:]
+
+
+def build_dictionary(klasses):
+    """build a zlib preset dictionary from class names and their
+    constructor parameter names, which are usually the field names.
+
+    the result has to be the same on both ends. pass it through
+    register_dictionary() everywhere frames using it are decoded, and keep
+    it unchanged for as long as such frames are stored
+    """
+    names = set()
+    fields = set()
+    for klass in klasses:
+        names.add(klass.__name__)
+        try:
+            params = inspect.signature(klass.__init__).parameters.values()
+        except (TypeError, ValueError):
+            continue
+        fields.update(p.name for p in params
+                      if p.name != 'self' and p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY))
+    return _make_dictionary(names, fields, _common_keys)
+
+
+def register_dictionary(zdict):
+    """make a dictionary available for decoding, returns its id"""
+    dict_id = zlib.adler32(zdict)
+    _dictionaries[dict_id] = zdict
+    return dict_id
+
+
+# version 1 of the default dictionary, from the classes in events.py and
+# message.py. it must never change, or stored frames become unreadable.
+# add a DEFAULT_DICTIONARY_V2 next to it instead
+DEFAULT_DICTIONARY_V1 = _make_dictionary(
+    ['AckComplete', 'FeedbackEncryptionComplete', 'FileNotification', 'IngestionComplete',
+     'IntegrityComplete', 'Message', 'MessageBatch', 'OrderingComplete', 'RefdataComplete'],
+    ['completeFilePath', 'configPath', 'dataPath', 'dumpPath', 'encryptedDataPath',
+     'encryptedMetaPath', 'encryptedPath', 'failurePath', 'feedbackPath', 'fileID',
+     'inputPath', 'isKindDone', 'isSuccess', 'origFileID', 'recvMtime', 'relativeSubPath',
+     'retention'],
+    ['args', 'kwargs', 'klass', 'id', 'events', 'messages',
+     'eventType', 'beginTimestamp', 'endTimestamp'])
+register_dictionary(DEFAULT_DICTIONARY_V1)
+
+DEFAULT_DICTIONARY = DEFAULT_DICTIONARY_V1
+
+
+def _lookup_dictionary(dict_id):
+    if dict_id not in _dictionaries:
+        raise ValueError("Unknown compression dictionary {:#010x}. "
+                         "Register it with register_dictionary()".format(dict_id))
+    return _dictionaries[dict_id]
+
+
+def _compressor(codec, level, zdict):
+    if codec == ZLIB:
+        level = zlib.Z_DEFAULT_COMPRESSION if level is None else level
+        if zdict:
+            return zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, zdict=zdict)
+        return zlib.compressobj(level)
+    if codec == LZMA:
+        return lzma.LZMACompressor(preset=level)
+    if codec == BZ2:
+        return bz2.BZ2Compressor(9 if level is None else level)
+    raise ValueError("Unsupported codec {}".format(codec))
+
+
+def _decompressor(codec_id, dict_id):
+    if codec_id not in _codec_names:
+        raise ValueError("Unsupported codec id {}".format(codec_id))
+    codec = _codec_names[codec_id]
+    if codec == ZLIB:
+        if dict_id:
+            return zlib.decompressobj(zdict=_lookup_dictionary(dict_id))
+        return zlib.decompressobj()
+    if codec == LZMA:
+        return lzma.LZMADecompressor()
+    return bz2.BZ2Decompressor()
+
+
+def _start(codec, level, dictionary):
+    if codec not in _codec_ids:
+        raise ValueError("Unsupported codec {}".format(codec))
+    zdict = None
+    dict_id = 0
+    if codec == ZLIB and dictionary:
+        zdict = dictionary
+        dict_id = register_dictionary(zdict)
+    header = _header.pack(MAGIC, _codec_ids[codec], dict_id)
+    return header, _compressor(codec, level, zdict)
+
+
+def _parse_header(frame):
+    if len(frame) < _header.size:
+        raise ValueError("Truncated compression frame")
+    magic, codec_id, dict_id = _header.unpack_from(frame)
+    if magic != MAGIC:
+        raise ValueError("Not a compression frame")
+    return _decompressor(codec_id, dict_id)
+
+
+def is_compressed(data):
+    return isinstance(data, (bytes, bytearray, memoryview)) and data[:len(MAGIC)] == MAGIC
+
+
+def compress(data, codec=ZLIB, level=None, dictionary=DEFAULT_DICTIONARY):
+    """compress serialized data (str or bytes-like) into a frame.
+
+    dictionary: zlib preset dictionary, None for none
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    header, compressor = _start(codec, level, dictionary)
+    return header + compressor.compress(data) + compressor.flush()
+
+
+def decompress(frame):
+    """decompress a frame back to the serialized bytes"""
+    decompressor = _parse_header(frame)
+    return decompressor.decompress(memoryview(frame)[_header.size:])
+
+
+class CompressedWriter:
+    """streams newline delimited serialized objects into a single
+    compressed frame, e.g. for log files
+
+    writer = CompressedWriter(f)
+    writer.write(msg)
+    writer.close()
+    """
+    def __init__(self, fileobj, codec=ZLIB, level=None, dictionary=DEFAULT_DICTIONARY):
+        self.fileobj = fileobj
+        self.codec = codec
+        header, self._compressor = _start(codec, level, dictionary)
+        self.fileobj.write(header)
+        self._buffer = bytearray()
+
+    def write(self, obj):
+        del self._buffer[:]
+        obj.serialize_into(self._buffer)
+        self._buffer += b'\n'
+        self.fileobj.write(self._compressor.compress(self._buffer))
+
+    def flush(self):
+        """flush compressed data written so far, the stream stays open"""
+        if self.codec == ZLIB:
+            self.fileobj.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.fileobj.flush()
+
+    def close(self):
+        self.fileobj.write(self._compressor.flush())
+        self.fileobj.flush()
+
+
+class CompressedReader:
+    """iterates over objects written by CompressedWriter"""
+    def __init__(self, fileobj, chunk_size=64 * 1024):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        from serializable import deserialize
+
+        decompressor = _parse_header(self.fileobj.read(_header.size))
+        pending = bytearray()
+        while True:
+            chunk = self.fileobj.read(self.chunk_size)
+            if not chunk:
+                break
+            pending += decompressor.decompress(chunk)
+            end = pending.rfind(b'\n')
+            if end < 0:
+                continue
+            for line in bytes(pending[:end]).split(b'\n'):
+                yield deserialize(line)
+            del pending[:end + 1]
+        if pending.strip():
+            yield deserialize(bytes(pending))
@@ -0,0 +1,182 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+"""
+Duplicate message detection for at-least-once transports
+"""
+
+
+def fingerprint(msg):
+    """content fingerprint of a message, independent of object identity.
+    msg may also be its output of serialize(), to avoid serializing again
+    """
+    if not isinstance(msg, (str, bytes, bytearray, memoryview)):
+        msg = msg.serialize()
+    if isinstance(msg, str):
+        msg = msg.encode('utf-8')
+    return hashlib.blake2b(msg, digest_size=16).digest()
+
+
+class _BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        nbits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.nhashes = max(1, int(round(nbits / capacity * math.log(2))))
+        # power of two so that an odd step visits distinct positions
+        self.nbits = 1 << (nbits - 1).bit_length()
+        self.bits = bytearray(self.nbits // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        mask = self.nbits - 1
+        return [(h1 + i * h2) & mask for i in range(self.nhashes)]
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key):
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+class DuplicateDetector:
+    """remembers recently seen messages by Message.id and reports repeats
+
+    max_size: number of entries kept, least recently seen ones are evicted
+    ttl: seconds an entry is kept after it was last seen, None for no expiry
+    use_fingerprint: also key on the message content, so a message that
+        comes back with the same id but different events is not a duplicate.
+        computing it serializes the message, callers that need it more than
+        once compute it with fingerprint() and pass it in
+    probabilistic: use two rotating bloom filters instead of an exact LRU.
+        memory no longer depends on the id length and the window is between
+        max_size and 2 * max_size messages, at the price of false positives
+        at roughly error_rate. ttl is not supported in this mode
+
+    safe to share between threads
+    """
+    def __init__(self, max_size=100000, ttl=None, use_fingerprint=False,
+                 probabilistic=False, error_rate=0.001):
+        if max_size <= 0:
+            raise ValueError("max_size must be positive: {}".format(max_size))
+        if probabilistic and ttl is not None:
+            raise ValueError("ttl is not supported in probabilistic mode")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.use_fingerprint = use_fingerprint
+        self.probabilistic = probabilistic
+        self.error_rate = error_rate
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        if probabilistic:
+            self._current = _BloomFilter(max_size, error_rate)
+            self._previous = None
+        else:
+            # key -> last seen time, ordered from least to most recently seen
+            self._entries = OrderedDict()
+
+    def _key(self, msg, digest=None):
+        if self.use_fingerprint:
+            if digest is None:
+                digest = fingerprint(msg)
+            return '{}:{}'.format(msg.id, digest.hex())
+        return msg.id
+
+    def is_duplicate(self, msg, digest=None):
+        """returns True if msg was seen before, otherwise remembers it
+
+        digest: fingerprint(msg) if the caller already has it
+        """
+        key = self._key(msg, digest)
+        with self._lock:
+            if self.probabilistic:
+                seen = self._check_bloom(key)
+            else:
+                seen = self._check_lru(key)
+            if seen:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return seen
+
+    def __contains__(self, msg):
+        """whether msg was seen, without recording it"""
+        return self.seen(msg)
+
+    def seen(self, msg, digest=None):
+        """whether msg was seen, without recording it
+
+        digest: fingerprint(msg) if the caller already has it
+        """
+        key = self._key(msg, digest)
+        with self._lock:
+            if self.probabilistic:
+                return key in self._current or (self._previous is not None and key in self._previous)
+            self._expire(time.monotonic())
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            if self.probabilistic:
+                return self._current.count + (self._previous.count if self._previous else 0)
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            if self.probabilistic:
+                self._current = _BloomFilter(self.max_size, self.error_rate)
+                self._previous = None
+            else:
+                self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def _expire(self, now):
+        if self.ttl is None:
+            return
+        entries = self._entries
+        while entries:
+            key, last_seen = next(iter(entries.items()))
+            if now - last_seen < self.ttl:
+                break
+            del entries[key]
+            self.evictions += 1
+
+    def _check_lru(self, key):
+        now = time.monotonic()
+        self._expire(now)
+        entries = self._entries
+        seen = key in entries
+        entries[key] = now
+        if seen:
+            entries.move_to_end(key)
+        elif len(entries) > self.max_size:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return seen
+
+    def _check_bloom(self, key):
+        if key in self._current:
+            return True
+        # seen in the previous window is kept alive into the current one
+        seen = self._previous is not None and key in self._previous
+        if self._current.count >= self.max_size:
+            if self._previous is not None:
+                self.evictions += self._previous.count
+            self._previous = self._current
+            self._current = _BloomFilter(self.max_size, self.error_rate)
+        self._current.add(key)
+        return seen
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from message import Message
+from serializable import Serializable, deserialize
+
+"""
+Delta encoding of Message history between pipeline hops
+
+Instead of the whole message, a sender ships only the events appended
+since a version of the message the receiver already has. The version of a
+message is its event count, plus a digest of the content of the events up
+to that count, so that events modified after they were sent, e.g. by
+mark_end_timestamp(), cause a full transfer instead of being lost.
+
+sender = DeltaSender()
+receiver = DeltaReceiver(MessageCache())
+
+payload = sender.encode(msg)
+try:
+    msg = receiver.decode(payload)
+except MissingBaseError as e:
+    sender.forget(e.msg_id)     # next encode() is a full transfer
+
+Messages with a retention policy drop events from the front of their
+history, so they are always sent in full.
+"""
+
+
+class MissingBaseError(KeyError):
+    """the receiver doesn't have the version a delta was built on"""
+    def __init__(self, msg_id):
+        super().__init__(msg_id)
+        self.msg_id = msg_id
+
+
+class MessageDelta(Serializable):
+    """events appended to message msgId after its first baseCount events"""
+    def __init__(self, msgId=None, baseCount=0, baseDigest=None, events=None):
+        super().__init__()
+        self.msgId = msgId
+        self.baseCount = baseCount
+        self.baseDigest = baseDigest
+        self.events = events if events is not None else []
+
+
+def _base_key(msg, count):
+    """digest of the content of the first count events. it's computed from
+    the whole history on every call, as any of the events may have changed
+    """
+    if not count:
+        return None
+    h = hashlib.blake2b(digest_size=16)
+    for event in msg.events[:count]:
+        h.update(json.dumps(event.to_dict(), sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _supports_delta(msg):
+    return getattr(msg, 'retention', None) is None
+
+
+def encode_delta(msg, base_count):
+    """delta of msg against its version with base_count events"""
+    if base_count > msg.count():
+        raise ValueError("Base count {} exceeds event count {}".format(base_count, msg.count()))
+    # events go through the same validation as Message.serialize
+    msg._validate_serializable()
+    delta = MessageDelta(msg.id, base_count, _base_key(msg, base_count), msg.events[base_count:])
+    return delta.serialize()
+
+
+def apply_delta(base, delta):
+    """new Message from base with the events of delta appended"""
+    if (base is None or base.id != delta.msgId or base.count() < delta.baseCount
+            or _base_key(base, delta.baseCount) != delta.baseDigest):
+        raise MissingBaseError(delta.msgId)
+    msg = Message()
+    msg.__dict__.update(base.__dict__)
+    msg.events = base.events[:delta.baseCount] + delta.events
+    return msg
+
+
+class MessageCache:
+    """bounded local cache of the latest known version of each message,
+    least recently used ones are evicted. safe to share between threads
+    """
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._messages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, msg_id):
+        with self._lock:
+            msg = self._messages.get(msg_id)
+            if msg is not None:
+                self._messages.move_to_end(msg_id)
+            return msg
+
+    def put(self, msg):
+        with self._lock:
+            self._messages[msg.id] = msg
+            self._messages.move_to_end(msg.id)
+            if len(self._messages) > self.max_size:
+                self._messages.popitem(last=False)
+
+    def discard(self, msg_id):
+        with self._lock:
+            self._messages.pop(msg_id, None)
+
+    def __contains__(self, msg_id):
+        with self._lock:
+            return msg_id in self._messages
+
+    def __len__(self):
+        with self._lock:
+            return len(self._messages)
+
+
+class DeltaSender:
+    """encodes messages for one receiver, as deltas against the version
+    last sent to it where possible
+    """
+    def __init__(self, max_size=10000):
+        # msg id -> (event count, digest of the events) last sent
+        self._sent = OrderedDict()
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    def encode(self, msg):
+        with self._lock:
+            sent = self._sent.get(msg.id)
+            count = msg.count()
+            if (sent is not None and _supports_delta(msg) and sent[0] <= count
+                    and _base_key(msg, sent[0]) == sent[1]):
+                payload = encode_delta(msg, sent[0])
+            else:
+                payload = msg.serialize()
+            self._sent[msg.id] = (count, _base_key(msg, count))
+            self._sent.move_to_end(msg.id)
+            if len(self._sent) > self.max_size:
+                self._sent.popitem(last=False)
+            return payload
+
+    def forget(self, msg_id):
+        """the receiver lost its copy, send the message in full next time"""
+        with self._lock:
+            self._sent.pop(msg_id, None)
+
+
+class DeltaReceiver:
+    """rebuilds messages from full or delta payloads using a cache"""
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else MessageCache()
+
+    def decode(self, payload):
+        """returns the full Message. raises MissingBaseError if payload is
+        a delta against a version that is not in the cache
+        """
+        obj = deserialize(payload)
+        if isinstance(obj, MessageDelta):
+            obj = apply_delta(self.cache.get(obj.msgId), obj)
+        elif not isinstance(obj, Message):
+            raise TypeError("{} is not Message".format(type(obj)))
+        self.cache.put(obj)
+        return obj
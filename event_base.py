@@ -1,5 +1,18 @@
 from serializable import Serializable
 import time
+import weakref
+
+
+# id -> weak reference of events that passed validation and haven't been
+# modified since. kept outside of the instances so it's neither serialized
+# nor compared. a plain dict, WeakValueDictionary lookups of missing keys
+# raise and catch KeyError internally, which is slow on every assignment
+_validated = {}
+
+
+def _forget(key, ref):
+    if _validated.get(key) is ref:
+        del _validated[key]
 
 
 class EventBase(Serializable):
@@ -19,13 +32,27 @@ class EventBase(Serializable):
     def mark_end_timestamp(self):
         self.endTimestamp = time.time()
 
+    def __setattr__(self, name, value):
+        if _validated:
+            _validated.pop(id(self), None)
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        if _validated:
+            _validated.pop(id(self), None)
+        object.__delattr__(self, name)
+
+    def is_dirty(self):
+        """whether the event was modified since it was last validated.
+        only attribute assignment is tracked, mutating a mutable attribute
+        in place is not
+        """
+        ref = _validated.get(id(self))
+        return ref is None or ref() is not self
+
     def to_dict(self):
         return self._traverse_dict(self.__dict__)
 
-    def serialize(self):
-        self._validate_serializable()
-        return super().serialize()
-
     def _validate_serializable(self):
         assert hasattr(self, 'eventType')
         assert hasattr(self, 'beginTimestamp')
@@ -34,3 +61,6 @@ class EventBase(Serializable):
         if self.beginTimestamp > self.endTimestamp:
             raise ValueError("Invalid timestamps. begin: {}, end: {}"
                              .format(self.beginTimestamp, self.endTimestamp))
+
+        key = id(self)
+        _validated[key] = weakref.ref(self, lambda ref: _forget(key, ref))
@@ -0,0 +1,226 @@
+import argparse
+import cProfile
+import inspect
+import pstats
+import random
+import sys
+import time
+import tracemalloc
+import events
+from event_base import EventBase
+from message import Message, MessageBatch
+from serializable import deserialize
+
+"""
+Synthetic load generator and profiler
+
+Builds Message streams from the events defined in events.py and runs
+serialize / deserialize / push / lookup loops against them, e.g.
+
+python3 loadgen.py --duration 5 --depth 20 --batch-size 100 \\
+    --mix FileNotification=3,IntegrityComplete=1 --profile out.prof
+"""
+
+OPERATIONS = ['serialize', 'deserialize', 'push', 'lookup']
+
+
+def event_klasses():
+    """all events defined in events.py by name"""
+    return {name: klass for name, klass in vars(events).items()
+            if inspect.isclass(klass) and issubclass(klass, EventBase)
+            and klass.__module__ == events.__name__}
+
+
+def parse_mix(mix):
+    """'FileNotification=3,AckComplete=1' -> {klass: weight}"""
+    klasses = event_klasses()
+    if not mix:
+        return {klass: 1 for klass in klasses.values()}
+    result = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        if name not in klasses:
+            raise ValueError("Unknown event {}, one of {}".format(name, sorted(klasses)))
+        result[klasses[name]] = float(weight) if weight else 1.0
+    return result
+
+
+class Generator:
+    """builds realistic messages from a weighted mix of event classes"""
+    def __init__(self, mix=None, depth=10, path_length=5, seed=None):
+        self.mix = mix if mix is not None else parse_mix(None)
+        self.depth = depth
+        self.path_length = path_length
+        self.random = random.Random(seed)
+        self._klasses = list(self.mix)
+        self._weights = [self.mix[k] for k in self._klasses]
+        self._n = 0
+
+    def _value(self, name):
+        self._n += 1
+        if name.endswith('Path'):
+            dirs = ['dir{}'.format(self.random.randrange(100)) for _ in range(self.path_length - 1)]
+            return '/' + '/'.join(dirs + ['{}{}.csv'.format(name, self._n)])
+        if name.endswith('Mtime'):
+            return time.time()
+        if name.endswith('ID'):
+            return self._n
+        if name.startswith('is'):
+            return self.random.random() < 0.5
+        return '{}{}'.format(name, self._n)
+
+    def event(self, klass=None):
+        if klass is None:
+            klass = self.random.choices(self._klasses, self._weights)[0]
+        params = [p for p in inspect.signature(klass.__init__).parameters if p != 'self']
+        return klass(**{p: self._value(p) for p in params})
+
+    def message(self, depth=None):
+        msg = Message()
+        for _ in range(self.depth if depth is None else depth):
+            msg.push_event(self.event())
+        return msg
+
+    def batch(self, size):
+        batch = MessageBatch()
+        for _ in range(size):
+            batch.push_back(self.message())
+        return batch
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+def _allocations(fn, iterations):
+    """peak and retained bytes per call"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(iterations):
+            fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak_bytes': peak - before, 'retained_bytes_per_call': (current - before) / iterations}
+
+
+def _repeat(fn, duration):
+    end = time.perf_counter() + duration
+    while True:
+        fn()
+        if time.perf_counter() >= end:
+            break
+
+
+def run(operation, fn, duration, items_per_call=1):
+    """call fn repeatedly for duration seconds, returns stats"""
+    latencies = []
+    end = time.perf_counter() + duration
+    while True:
+        start = time.perf_counter()
+        if start >= end and latencies:
+            break
+        fn()
+        latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    latencies.sort()
+    result = {
+        'operation': operation,
+        'calls': len(latencies),
+        'calls_per_sec': len(latencies) / total if total else 0.0,
+        'items_per_sec': len(latencies) * items_per_call / total if total else 0.0,
+    }
+    for p in (50, 90, 99):
+        result['p{}_us'.format(p)] = _percentile(latencies, p) * 1e6
+    result.update(_allocations(fn, min(100, len(latencies))))
+    return result
+
+
+def workloads(generator, batch_size):
+    """operation name -> (fn, items per call)"""
+    batch = generator.batch(batch_size)
+    serialized = batch.serialize()
+    msg = generator.message()
+    event = generator.event()
+    names = [k.__name__ for k in generator.mix]
+
+    def push():
+        msg.push_event(event)
+        msg.events.pop()
+
+    def lookup():
+        msg.get_event(generator.random.choice(names))
+
+    return {
+        'serialize': (batch.serialize, batch_size),
+        'deserialize': (lambda: deserialize(serialized), batch_size),
+        'push': (push, 1),
+        'lookup': (lookup, 1),
+    }
+
+
+def format_report(results):
+    columns = ['operation', 'calls', 'calls_per_sec', 'items_per_sec',
+               'p50_us', 'p90_us', 'p99_us', 'peak_bytes', 'retained_bytes_per_call']
+    lines = ['  '.join('{:>14}'.format(c) for c in columns)]
+    for r in results:
+        lines.append('  '.join('{:>14}'.format(r[c] if isinstance(r[c], (str, int)) else '{:.1f}'.format(r[c]))
+                               for c in columns))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Synthetic load generator and profiler')
+    parser.add_argument('--duration', type=float, default=2.0, help='seconds per operation')
+    parser.add_argument('--depth', type=int, default=10, help='events per message')
+    parser.add_argument('--path-length', type=int, default=5, help='components per generated path')
+    parser.add_argument('--batch-size', type=int, default=100, help='messages per batch')
+    parser.add_argument('--mix', default=None, help='event weights, e.g. FileNotification=3,AckComplete=1')
+    parser.add_argument('--operations', default=','.join(OPERATIONS), help='comma separated subset of ' + ','.join(OPERATIONS))
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--profile', default=None, help='write cProfile stats to this file')
+    parser.add_argument('--tracemalloc', default=None, help='write top allocation sites to this file')
+    args = parser.parse_args(argv)
+
+    operations = args.operations.split(',')
+    for op in operations:
+        if op not in OPERATIONS:
+            parser.error("unknown operation {}".format(op))
+
+    generator = Generator(parse_mix(args.mix), args.depth, args.path_length, args.seed)
+    loads = workloads(generator, args.batch_size)
+
+    # latencies are measured without profiling or tracing overhead,
+    # --profile and --tracemalloc each run the operations again afterwards
+    results = [run(op, loads[op][0], args.duration, loads[op][1]) for op in operations]
+    print(format_report(results))
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        for op in operations:
+            profiler.enable()
+            _repeat(loads[op][0], args.duration)
+            profiler.disable()
+        profiler.dump_stats(args.profile)
+        with open(args.profile + '.txt', 'w') as f:
+            pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(50)
+    if args.tracemalloc:
+        tracemalloc.start(25)
+        try:
+            for op in operations:
+                _repeat(loads[op][0], args.duration)
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        with open(args.tracemalloc, 'w') as f:
+            for stat in snapshot.statistics('lineno')[:50]:
+                f.write('{}\n'.format(stat))
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -1,9 +1,23 @@
 import functools
-from serializable import Serializable
+from serializable import Serializable, _loads
 from event_base import EventBase
 from uuid import uuid1
 
 
+class RetentionPolicy(Serializable):
+    """bounds the event history kept by a Message
+
+    max_events: keep only the last n events
+    latest_per_type: keep only the latest event of each type
+    """
+    def __init__(self, max_events=None, latest_per_type=False):
+        super().__init__(max_events, latest_per_type)
+        if max_events is not None and max_events <= 0:
+            raise ValueError("max_events must be positive: {}".format(max_events))
+        self.maxEvents = max_events
+        self.latestPerType = latest_per_type
+
+
 class Message(Serializable):
     """tranmission unit for inter-components event notification
     Message is a serilizable class that can be used to track a sequence
@@ -16,11 +30,19 @@ class Message(Serializable):
     No public api is provided to remove an event as it is intended to keep all event
     history. But there's nothing that prevents you from doing it.
 
+    For long-lived messages a RetentionPolicy can be given to bound the
+    history. Dropped events are summarized per type in `dropped`, with
+    their count and first begin / last end timestamps, and still count
+    for has_seen().
+
     """
-    def __init__(self):
+    def __init__(self, retention=None):
         super().__init__()
         self.events = []
         self.id = str(uuid1())
+        if retention is not None:
+            self.retention = retention
+            self.dropped = {}
 
     def push_event(self, event):
         if not isinstance(event, EventBase):
@@ -31,8 +53,36 @@ class Message(Serializable):
         #    raise TypeError("{} is already in the message".format(type(event)))
 
         self.events.append(event)
+        if getattr(self, 'retention', None) is not None:
+            self._compact()
         return self
 
+    def _compact(self):
+        events = self.events
+        if self.retention.latestPerType:
+            event_type = events[-1].event_type()
+            i = next((i for i in range(len(events) - 2, -1, -1)
+                      if events[i].event_type() == event_type), None)
+            if i is not None:
+                self._drop(events.pop(i))
+        max_events = self.retention.maxEvents
+        if max_events is not None:
+            while len(events) > max_events:
+                self._drop(events.pop(0))
+
+    def _drop(self, event):
+        summary = self.dropped.get(event.event_type())
+        if summary is None:
+            self.dropped[event.event_type()] = {
+                'count': 1,
+                'firstBeginTimestamp': event.beginTimestamp,
+                'lastEndTimestamp': event.endTimestamp,
+            }
+            return
+        summary['count'] += 1
+        summary['firstBeginTimestamp'] = min(summary['firstBeginTimestamp'], event.beginTimestamp)
+        summary['lastEndTimestamp'] = max(summary['lastEndTimestamp'], event.endTimestamp)
+
     def last_event(self):
         return self.events[-1] if self.count() else None
 
@@ -43,6 +93,16 @@ class Message(Serializable):
         """supports in operator"""
         return self._find_event(event_klass) is not None
 
+    def has_seen(self, event_klass):
+        """whether the message ever had an event of this type, including
+        events dropped by the retention policy
+        """
+        if self._find_event(event_klass) is not None:
+            return True
+        if isinstance(event_klass, type):
+            event_klass = event_klass.__name__
+        return event_klass in getattr(self, 'dropped', ())
+
     def get_event(self, event_klass):
         return self._find_event(event_klass)
 
@@ -59,10 +119,42 @@ class Message(Serializable):
     def __str__(self):
         return str(self._traverse_dict(self.__dict__))
 
-    def serialize(self):
+    @classmethod
+    def deserialize_projected(cls, serialized, event_types=None, last=None):
+        """decode a message with only some of its events, e.g. for routing
+
+        event_types: only keep events of these types, by type or by string
+        last: only keep the last n matching events, 0 keeps id only
+
+        events that are not selected are dropped by their klass tag before
+        any object is built for them. the result is a partial view and
+        should not be forwarded in place of the original message
+        """
+        data = _loads(serialized)
+        if '$id' in data:
+            # dropped events may define objects referenced by kept ones,
+            # so payloads with references are decoded in full
+            msg = cls.from_data(data)
+            msg.events = _project_events(msg.events, lambda e: e.event_type(), event_types, last)
+            return msg
+        data['events'] = _project_events(data.get('events', []), lambda e: e.get('klass'),
+                                         event_types, last)
+        return cls.from_data(data)
+
+    def _validate_serializable(self):
+        # only events modified since their last validation are checked
         for event in self.events:
-            event._validate_serializable()
-        return super().serialize()
+            if event.is_dirty():
+                event._validate_serializable()
+
+
+def _project_events(events, type_of, event_types, last):
+    if event_types is not None:
+        names = set(t.__name__ if isinstance(t, type) else t for t in event_types)
+        events = [e for e in events if type_of(e) in names]
+    if last is not None:
+        events = events[-last:] if last else []
+    return events
 
 
 class MessageBatch(Serializable):
@@ -0,0 +1,123 @@
+import bisect
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from message import MessageBatch
+from serializable import deserialize
+
+"""
+Splits MessageBatches by key so that all messages with the same key, e.g.
+the same FileNotification.inputPath, are handled by the same worker in
+arrival order
+"""
+
+
+def stable_hash(key):
+    """hash that is the same in every process, unlike hash()"""
+    return zlib.crc32(str(key).encode('utf-8'))
+
+
+def event_field_key(event_klass, field):
+    """key function taking field of the latest event_klass in a message.
+    messages without it are keyed by their id
+    """
+    def key(msg):
+        event = msg.get_event(event_klass)
+        value = getattr(event, field, None) if event is not None else None
+        return msg.id if value is None else value
+    return key
+
+
+class HashRing:
+    """consistent hashing of keys onto partitions 0..n-1, so changing n
+    only moves about 1/n of the keys
+    """
+    def __init__(self, partitions, replicas=100):
+        self.partitions = partitions
+        points = sorted((stable_hash('{}-{}'.format(p, r)), p)
+                        for p in range(partitions) for r in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._owners = [p for _, p in points]
+
+    def __call__(self, key):
+        i = bisect.bisect(self._hashes, stable_hash(key)) % len(self._hashes)
+        return self._owners[i]
+
+
+class Partitioner:
+    """assigns messages to one of n partitions by key
+
+    partitioner = Partitioner(4, event_field_key(FileNotification, 'inputPath'))
+    for i, sub_batch in enumerate(partitioner.split(batch)):
+        ...
+    """
+    def __init__(self, partitions, key, consistent=False, replicas=100):
+        if partitions <= 0:
+            raise ValueError("partitions must be positive: {}".format(partitions))
+        self.partitions = partitions
+        self.key = key
+        self._ring = HashRing(partitions, replicas) if consistent else None
+
+    def partition_of(self, msg):
+        key = self.key(msg)
+        if self._ring is not None:
+            return self._ring(key)
+        return stable_hash(key) % self.partitions
+
+    def split(self, batch):
+        """list of partitions sub-batches, keeping arrival order in each"""
+        result = [MessageBatch() for _ in range(self.partitions)]
+        for msg in batch:
+            result[self.partition_of(msg)].push_back(msg)
+        return result
+
+
+def _consume(handler, serialized):
+    return [handler(msg) for msg in deserialize(serialized)]
+
+
+class PartitionedConsumer:
+    """runs handler(msg) for every message of a batch in a process pool,
+    one task per partition so each key is handled in order by one process.
+    the pool is started once and reused for every batch
+
+    with PartitionedConsumer(partitioner, handle) as consumer:
+        for batch in batches:
+            results = consumer.consume(batch)
+
+    sub-batches are shipped in serialized form. handler must be picklable,
+    i.e. a module level function
+    """
+    def __init__(self, partitioner, handler, executor=None):
+        """executor: pool to submit to, it's left running on close()"""
+        self.partitioner = partitioner
+        self.handler = handler
+        self._own_executor = executor is None
+        self.executor = ProcessPoolExecutor(partitioner.partitions) if executor is None else executor
+
+    def consume(self, batch):
+        """returns the handler results per partition, empty partitions
+        are not submitted
+        """
+        futures = [self.executor.submit(_consume, self.handler, sub_batch.serialize())
+                   if len(sub_batch) else None
+                   for sub_batch in self.partitioner.split(batch)]
+        return [f.result() if f is not None else [] for f in futures]
+
+    def close(self):
+        if self._own_executor:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def consume_partitioned(batch, partitioner, handler, executor=None):
+    """consume a single batch with PartitionedConsumer. without an
+    executor a pool is started and shut down for this batch only, use a
+    PartitionedConsumer for a stream of batches
+    """
+    with PartitionedConsumer(partitioner, handler, executor) as consumer:
+        return consumer.consume(batch)
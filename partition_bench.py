@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import time
+from events import FileNotification, IntegrityComplete
+from message import Message, MessageBatch
+from partition import PartitionedConsumer, Partitioner, event_field_key
+
+"""
+Scaling harness for PartitionedConsumer
+
+Consumes the same batches with 1..N worker processes, a CPU bound handler
+standing in for real work, and reports throughput and speedup over one
+worker, e.g.
+
+python3 partition_bench.py --workers 1,2,4,8 --batches 20 --work 20000
+"""
+
+
+def burn(msg):
+    """handler spending work iterations of cpu per message"""
+    total = 0
+    for i in range(msg.work):
+        total += i * i
+    return total
+
+
+def make_batches(count, size, files, work):
+    batches = []
+    for b in range(count):
+        batch = MessageBatch()
+        for i in range(size):
+            msg = Message()
+            msg.push_event(FileNotification('/in/file{}.csv'.format(i % files), 0))
+            msg.push_event(IntegrityComplete('/clean/file{}.csv'.format(i % files), None, b * size + i))
+            msg.work = work
+            batch.push_back(msg)
+        batches.append(batch)
+    return batches
+
+
+def measure(workers, batches):
+    """messages per second consuming batches with workers processes"""
+    partitioner = Partitioner(workers, event_field_key(FileNotification, 'inputPath'))
+    with PartitionedConsumer(partitioner, burn) as consumer:
+        # start the pool outside the timing
+        consumer.consume(batches[0])
+        start = time.perf_counter()
+        for batch in batches:
+            consumer.consume(batch)
+        elapsed = time.perf_counter() - start
+    return sum(len(b) for b in batches) / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PartitionedConsumer scaling harness')
+    parser.add_argument('--workers', default='1,2,4', help='comma separated worker counts')
+    parser.add_argument('--batches', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=200, help='messages per batch')
+    parser.add_argument('--files', type=int, default=64, help='distinct keys')
+    parser.add_argument('--work', type=int, default=10000, help='cpu iterations per message')
+    args = parser.parse_args(argv)
+
+    workers = [int(w) for w in args.workers.split(',')]
+    batches = make_batches(args.batches, args.batch_size, args.files, args.work)
+
+    print('cpus: {}'.format(os.cpu_count()))
+    print('{:>8}  {:>14}  {:>8}'.format('workers', 'msgs_per_sec', 'speedup'))
+    results = []
+    for n in workers:
+        rate = measure(n, batches)
+        results.append((n, rate))
+        print('{:>8}  {:>14.1f}  {:>8.2f}'.format(n, rate, rate / results[0][1]))
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
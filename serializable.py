@@ -1,59 +1,199 @@
+import importlib
 import json
+import os
+import compression
 
 
 klass_registry = {}
 
+# klass name -> module path, for classes imported on first use
+_declared_klasses = {}
+
+_encoder = json.JSONEncoder()
+
+
+def _is_global(klass):
+    # classes defined inside functions can't be imported by name, and are
+    # legitimately redefined each time the function runs
+    return '<locals>' not in klass.__qualname__
+
 
 def register_klass(klass):
-    klass_registry[klass.__name__] = klass
+    name = klass.__name__
+    if _is_global(klass):
+        existing = klass_registry.get(name)
+        if (existing is not None and _is_global(existing)
+                and (existing.__module__, existing.__qualname__) != (klass.__module__, klass.__qualname__)):
+            raise ValueError("Class name {} collides: {}.{} and {}.{}"
+                             .format(name, existing.__module__, existing.__qualname__,
+                                     klass.__module__, klass.__qualname__))
+        declared = _declared_klasses.get(name)
+        if declared is not None and declared != klass.__module__:
+            raise ValueError("Class name {} collides: declared in {}, defined in {}"
+                             .format(name, declared, klass.__module__))
+    klass_registry[name] = klass
+
+
+def declare_klass(name, module):
+    """declare which module defines a class, so the module is only
+    imported the first time a payload of that class is deserialized
+    """
+    existing = klass_registry.get(name)
+    if existing is not None and _is_global(existing) and existing.__module__ != module:
+        raise ValueError("Class name {} collides: defined in {}, declared in {}"
+                         .format(name, existing.__module__, module))
+    if _declared_klasses.get(name, module) != module:
+        raise ValueError("Class name {} collides: declared in {} and {}"
+                         .format(name, _declared_klasses[name], module))
+    _declared_klasses[name] = module
+
+
+def resolve_klass(name):
+    """registered class by name, importing its module if it was declared.
+    returns None for unknown classes
+    """
+    klass = klass_registry.get(name)
+    if klass is None and name in _declared_klasses:
+        importlib.import_module(_declared_klasses[name])
+        klass = klass_registry.get(name)
+        if klass is None:
+            raise ValueError("Class {} not found in module {}".format(name, _declared_klasses[name]))
+    return klass
+
+
+def resolve_declared_klasses():
+    """import all declared modules. a declaration that fails to resolve
+    doesn't stop the others, returns {name: error} of the failed ones
+    """
+    failed = {}
+    for name in list(_declared_klasses):
+        try:
+            resolve_klass(name)
+        except Exception as e:
+            failed[name] = e
+    return failed
+
+
+def build_manifest(modules):
+    """import modules and map the classes they define to their module"""
+    for module in modules:
+        importlib.import_module(module)
+    modules = set(modules)
+    return {name: klass.__module__ for name, klass in klass_registry.items()
+            if klass.__module__ in modules and _is_global(klass)}
+
+
+def load_manifest(path, modules=None):
+    """declare all classes of a manifest file.
+
+    if the file doesn't exist and modules are given, the manifest is built
+    from them and cached at path. delete the file to rebuild it
+    """
+    if not os.path.exists(path) and modules is not None:
+        manifest = build_manifest(modules)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+    else:
+        with open(path) as f:
+            manifest = json.load(f)
+
+    for name, module in manifest.items():
+        declare_klass(name, module)
+    return manifest
 
 
 
 def deserialize(serialized):
-    data = json.loads(serialized)
+    """
+    serialized can be str, bytes, bytearray or memoryview, so data read
+    from sockets or mmaps doesn't need to be decoded into a str first.
+    compressed frames are detected and decompressed
+    """
+    data = _loads(serialized)
     if 'klass' not in data:
         raise ValueError("klass info not found")
-    name = data['klass']
-    if name not in klass_registry:
+    target_class = _target_klass(data['klass'])
+    return target_class.from_data(data)
+
+
+def _target_klass(name):
+    target_class = resolve_klass(name)
+    if target_class is None:
         raise ValueError("Unregistered class {}. Not serializable".format(name))
-    target_class = klass_registry[name]
-    return target_class.deserialize(serialized)
+    return target_class
+
 
+def _loads(serialized):
+    if compression.is_compressed(serialized):
+        serialized = compression.decompress(serialized)
+    # json accepts str, bytes and bytearray, but not memoryview
+    if isinstance(serialized, memoryview):
+        serialized = str(serialized, 'utf-8')
+    return json.loads(serialized)
 
-def _deserialize_i(data):
+
+def _deserialize_i(data, refs=None):
     args = data.get('args', [])
     kwargs = data.get('kwargs', {})
 
     # remove meta when deserializing
     name = data.pop('klass', None)
+    ref_id = data.pop('$id', None)
 
     obj = None
+    target_class = _target_klass(name) if name else None
     try:
-        if name:
-            target_class = klass_registry[name]
+        if target_class is not None:
             obj = target_class(*args, **kwargs)
     except TypeError as e:
         raise type(e)(str(e) + '\nThis usually indicates there are'  \
                       ' constructor parameters that shoud be passed to super __init__')
 
+    if refs is not None and ref_id is not None:
+        refs[ref_id] = obj
+
     for k, v in data.items():
-        if isinstance(v, dict) and 'klass' in v:
-            v_data, v_obj = _deserialize_i(v)
-            v_obj.__dict__ = v_data
-            data[k] = v_obj
-        elif isinstance(v, list):
-            result = []
-            for i in v:
-                if isinstance(i, dict) and 'klass' in i:
-                    v_data, v_obj = _deserialize_i(i)
-                    v_obj.__dict__ = v_data
-                    result.append(v_obj)
-                else:
-                    result.append(i)
-            data[k] = result
+        if isinstance(v, list):
+            data[k] = [_revive(i, refs) for i in v]
+        else:
+            data[k] = _revive(v, refs)
     return data, obj
 
 
+def _revive(v, refs):
+    """turn a nested serialized dict back into an object, resolving
+    back-references produced by serialize(preserve_refs=True)
+    """
+    if not isinstance(v, dict):
+        return v
+    if refs is not None and '$ref' in v:
+        return refs[v['$ref']]
+    if 'klass' in v:
+        v_data, v_obj = _deserialize_i(v, refs)
+        v_obj.__dict__ = v_data
+        return v_obj
+    if refs is not None:
+        return _unescape_keys(v)
+    return v
+
+
+def _escape_keys(d):
+    """plain dict keys starting with '$' get another '$', so that they
+    can't be taken for '$ref' / '$id' of preserve_refs
+    """
+    if not any(isinstance(k, str) and k.startswith('$') for k in d):
+        return d
+    return {'$' + k if isinstance(k, str) and k.startswith('$') else k: v for k, v in d.items()}
+
+
+def _unescape_keys(d):
+    if not any(k.startswith('$') for k in d):
+        return d
+    return {k[1:] if k.startswith('$') else k: v for k, v in d.items()}
+
+
 class RegistryMeta(type):
     def __new__(meta, name, bases, class_dict):
         cls = type.__new__(meta, name, bases, class_dict)
@@ -69,21 +209,31 @@ class Serializable(metaclass=RegistryMeta):
     def type(self):
         return self.__class__.__name__
 
-    def _traverse_dict(self, instance_dict):
+    def _traverse_dict(self, instance_dict, refs=None):
         result = {}
         for k, v in instance_dict.items():
-            result[k] = self._traverse(k, v)
+            result[k] = self._traverse(k, v, refs)
         return result
 
-    def _traverse(self, k, v):
+    def _traverse(self, k, v, refs=None):
         if isinstance(v, Serializable):
-            result = self._traverse_dict(v.__dict__)
+            if refs is not None:
+                if id(v) in refs:
+                    return {'$ref': refs[id(v)]}
+                ref_id = refs[id(v)] = len(refs)
+            result = self._traverse_dict(v.__dict__, refs)
             result['klass'] = v.__class__.__name__
+            if refs is not None:
+                result['$id'] = ref_id
             return result
+        # deserialize only revives objects held directly by an attribute or
+        # by a list attribute, so no ids are given out inside plain dicts
+        # or nested lists, where a back-reference couldn't be resolved
         if isinstance(v, dict):
-            return self._traverse_dict(v)
+            result = self._traverse_dict(v)
+            return _escape_keys(result) if refs is not None else result
         elif isinstance(v, list):
-            return [self._traverse(k, i) for i in v]
+            return [self._traverse(k, i, None if isinstance(i, list) else refs) for i in v]
         elif isinstance(v, (set, tuple)):
             """
             set is not serializable to json, thus we don't allow it
@@ -98,10 +248,49 @@ class Serializable(metaclass=RegistryMeta):
             return v
 
 
-    def serialize(self):
-        result = self._traverse_dict(self.__dict__)
+    def _validate_serializable(self):
+        """hook for subclasses to check their state before serializing"""
+        pass
+
+    def _serializable_dict(self, preserve_refs=False):
+        self._validate_serializable()
+        refs = {id(self): 0} if preserve_refs else None
+        result = self._traverse_dict(self.__dict__, refs)
         result['klass'] = self.__class__.__name__
-        return json.dumps(result)
+        if preserve_refs:
+            result['$id'] = 0
+        return result
+
+    def serialize(self, preserve_refs=False):
+        """
+        preserve_refs: encode each distinct Serializable instance only once
+        and refer back to it afterwards, so objects shared between several
+        places (e.g. the same event pushed into many messages) keep their
+        identity when deserialized
+        """
+        return json.dumps(self._serializable_dict(preserve_refs))
+
+    def serialize_into(self, buffer, preserve_refs=False, codec=None):
+        """append utf-8 encoded output to a bytearray, e.g. a reusable
+        write buffer.
+
+        json's C encoder only produces a str, so this makes one copy more
+        than serialize().encode(): the encoded bytes are copied into
+        buffer. it saves allocating a new buffer per object, not copies.
+
+        codec: one of compression.ZLIB, LZMA, BZ2 to append a compressed
+        frame instead, deserialize() detects it automatically
+
+        returns number of bytes written
+        """
+        start = len(buffer)
+        # iterencode() would avoid the intermediate str, but only the one
+        # shot encode() uses the C accelerated encoder and is much faster
+        data = _encoder.encode(self._serializable_dict(preserve_refs)).encode('utf-8')
+        if codec is not None:
+            data = compression.compress(data, codec)
+        buffer += data
+        return len(buffer) - start
 
     def __repr__(self):
         return repr(self.__dict__)
@@ -114,7 +303,14 @@ class Serializable(metaclass=RegistryMeta):
 
     @classmethod
     def deserialize(cls, serialized):
-        data = json.loads(serialized)
-        data, obj = _deserialize_i(data)
+        return cls.from_data(_loads(serialized))
+
+    @classmethod
+    def from_data(cls, data):
+        """build object from already parsed json data"""
+        # only payloads written with preserve_refs carry back-references,
+        # elsewhere '$ref' is just an ordinary key
+        refs = {} if '$id' in data else None
+        data, obj = _deserialize_i(data, refs)
         obj.__dict__ = data
         return obj
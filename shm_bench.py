@@ -0,0 +1,111 @@
+import argparse
+import multiprocessing
+import sys
+import time
+from loadgen import Generator
+from serializable import deserialize
+from shm_channel import SharedMemoryChannel
+
+"""
+Transport comparison for SharedMemoryChannel
+
+Sends the same serialized MessageBatches from this process to a consumer
+process over SharedMemoryChannel, multiprocessing.Queue and Pipe. The
+consumer deserializes each batch. Reports batches per second and the
+mean latency from send to deserialized, e.g.
+
+python3 shm_bench.py --batches 1000 --batch-size 20 --depth 10
+"""
+
+TRANSPORTS = ['shm', 'queue', 'pipe']
+
+
+def _shm_consumer(channel, count, results):
+    latencies = []
+    for _ in range(count):
+        batch = channel.recv()
+        latencies.append(time.perf_counter() - batch.sentAt)
+    channel.close()
+    results.put(latencies)
+
+
+def _queue_consumer(q, count, results):
+    latencies = []
+    for _ in range(count):
+        batch = deserialize(q.get())
+        latencies.append(time.perf_counter() - batch.sentAt)
+    results.put(latencies)
+
+
+def _pipe_consumer(conn, count, results):
+    latencies = []
+    for _ in range(count):
+        batch = deserialize(conn.recv_bytes())
+        latencies.append(time.perf_counter() - batch.sentAt)
+    results.put(latencies)
+
+
+def measure(transport, batches, slot_size):
+    """(batches per second, mean latency in us) of sending batches to a
+    consumer process. perf_counter is system wide on linux, so it's
+    comparable across the two processes
+    """
+    results = multiprocessing.Queue()
+    if transport == 'shm':
+        channel = SharedMemoryChannel(slots=64, slot_size=slot_size)
+        consumer = multiprocessing.Process(target=_shm_consumer, args=(channel, len(batches), results))
+        send = channel.send
+    elif transport == 'queue':
+        q = multiprocessing.Queue()
+        consumer = multiprocessing.Process(target=_queue_consumer, args=(q, len(batches), results))
+        send = lambda batch: q.put(batch.serialize().encode('utf-8'))
+    else:
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        consumer = multiprocessing.Process(target=_pipe_consumer, args=(reader, len(batches), results))
+        send = lambda batch: writer.send_bytes(batch.serialize().encode('utf-8'))
+
+    consumer.start()
+    start = time.perf_counter()
+    for batch in batches:
+        batch.sentAt = time.perf_counter()
+        send(batch)
+    latencies = results.get()
+    elapsed = time.perf_counter() - start
+    consumer.join()
+    if transport == 'shm':
+        channel.close()
+        channel.unlink()
+    return len(batches) / elapsed, sum(latencies) / len(latencies) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SharedMemoryChannel transport comparison')
+    parser.add_argument('--transports', default=','.join(TRANSPORTS), help='comma separated subset of ' + ','.join(TRANSPORTS))
+    parser.add_argument('--batches', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=20, help='messages per batch')
+    parser.add_argument('--depth', type=int, default=10, help='events per message')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    transports = args.transports.split(',')
+    for transport in transports:
+        if transport not in TRANSPORTS:
+            parser.error("unknown transport {}".format(transport))
+
+    generator = Generator(depth=args.depth, seed=args.seed)
+    batches = [generator.batch(args.batch_size) for _ in range(args.batches)]
+    size = max(len(b.serialize()) for b in batches)
+
+    print('batch bytes: {}'.format(size))
+    print('{:>10}  {:>16}  {:>16}'.format('transport', 'batches_per_sec', 'mean_latency_us'))
+    results = []
+    for transport in transports:
+        # room for the sentAt field added on send
+        rate, latency = measure(transport, batches, size + 1024)
+        results.append((transport, rate, latency))
+        print('{:>10}  {:>16.1f}  {:>16.1f}'.format(transport, rate, latency))
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,127 @@
+import unittest
+import queue
+import threading
+import time
+from unittest import mock
+from batcher import MicroBatcher
+from event_base import EventBase
+from message import Message
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_max_count(self):
+        batcher = MicroBatcher(max_count=3, max_linger=10)
+        for _ in range(7):
+            batcher.submit(Message())
+
+        self.assertEqual(3, len(batcher.get_nowait()))
+        self.assertEqual(3, len(batcher.get(timeout=0.01)))
+        self.assertRaises(queue.Empty, batcher.get_nowait)
+        self.assertRaises(queue.Empty, batcher.get, True, 0.01)
+
+        batcher.flush()
+        self.assertEqual(1, len(batcher.get_nowait()))
+
+        stats = batcher.stats()
+        self.assertEqual(3, stats['batches'])
+        self.assertEqual(7, stats['messages'])
+        self.assertEqual(0, stats['pending'])
+        self.assertAlmostEqual(7 / 9, stats['avg_fill'])
+
+        self.assertRaises(TypeError, batcher.submit, 'not a message')
+        self.assertRaises(ValueError, MicroBatcher, 0)
+
+    def test_max_bytes(self):
+        class Event1(EventBase):
+            pass
+
+        msg = Message().push_event(Event1())
+        size = len(msg.serialize())
+        # timestamps don't always serialize to the same length
+        batcher = MicroBatcher(max_count=100, max_bytes=size * 2 + 20, max_linger=10)
+        for _ in range(5):
+            batcher.submit(Message().push_event(Event1()))
+
+        self.assertEqual(2, len(batcher.get_nowait()))
+        self.assertEqual(2, len(batcher.get_nowait()))
+        self.assertRaises(queue.Empty, batcher.get_nowait)
+
+    def test_max_bytes_given_size(self):
+        class Event1(EventBase):
+            pass
+
+        batcher = MicroBatcher(max_count=100, max_bytes=100, max_linger=10)
+        with mock.patch.object(Message, 'serialize_into') as serialize_into:
+            for _ in range(5):
+                batcher.submit(Message().push_event(Event1()), size=40)
+            serialize_into.assert_not_called()
+        self.assertEqual(2, len(batcher.get_nowait()))
+        self.assertEqual(2, len(batcher.get_nowait()))
+
+    def test_max_linger(self):
+        batcher = MicroBatcher(max_count=100, max_linger=0.05)
+        batcher.submit(Message())
+        self.assertRaises(queue.Empty, batcher.get_nowait)
+
+        start = time.monotonic()
+        batch = batcher.get(timeout=1)
+        self.assertEqual(1, len(batch))
+        self.assertGreaterEqual(time.monotonic() - start, 0.03)
+
+        # a consumer already waiting picks up the linger of a new batch
+        result = []
+        consumer = threading.Thread(target=lambda: result.append(batcher.get(timeout=1)))
+        consumer.start()
+        time.sleep(0.01)
+        batcher.submit(Message())
+        consumer.join()
+        self.assertEqual(1, len(result[0]))
+
+    def test_backpressure(self):
+        batcher = MicroBatcher(max_count=2, max_linger=10, max_pending=2)
+        batcher.submit(Message())
+        batcher.submit(Message())
+        self.assertRaises(queue.Full, batcher.submit, Message(), False)
+        self.assertRaises(queue.Full, batcher.submit, Message(), True, 0.01)
+
+        threading.Timer(0.02, batcher.get_nowait).start()
+        batcher.submit(Message(), timeout=1)
+        self.assertGreater(batcher.stats()['submit_wait'], 0)
+
+    def test_close(self):
+        batcher = MicroBatcher(max_count=10, max_linger=10)
+        batcher.submit(Message())
+        batcher.close()
+        self.assertEqual(1, len(batcher.get()))
+        self.assertEqual(None, batcher.get())
+        self.assertRaises(ValueError, batcher.submit, Message())
+
+    def test_threads(self):
+        batcher = MicroBatcher(max_count=16, max_linger=0.01, max_pending=64)
+        producers = [threading.Thread(target=lambda: [batcher.submit(Message()) for _ in range(250)])
+                     for _ in range(4)]
+        received = []
+
+        def consume():
+            while True:
+                batch = batcher.get()
+                if batch is None:
+                    break
+                received.extend(m.id for m in batch)
+
+        consumers = [threading.Thread(target=consume) for _ in range(2)]
+        for t in producers + consumers:
+            t.start()
+        for t in producers:
+            t.join()
+        batcher.close()
+        for t in consumers:
+            t.join()
+
+        self.assertEqual(1000, len(received))
+        self.assertEqual(1000, len(set(received)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import io
+import os
+import subprocess
+import sys
+import compression
+import events
+from event_base import EventBase
+from events import FileNotification, IntegrityComplete
+from message import Message, MessageBatch
+from serializable import deserialize
+
+
+def make_batch(n):
+    batch = MessageBatch()
+    for i in range(n):
+        msg = Message()
+        msg.push_event(FileNotification('/data/incoming/file{}.csv'.format(i), 1000 + i))
+        msg.push_event(IntegrityComplete('/data/clean/file{}.csv'.format(i), '/data/feedback', i, i))
+        batch.push_back(msg)
+    return batch
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_roundtrip(self):
+        batch = make_batch(20)
+        serialized = batch.serialize()
+        for codec in (compression.ZLIB, compression.LZMA, compression.BZ2):
+            frame = compression.compress(serialized, codec)
+            self.assertTrue(compression.is_compressed(frame))
+            self.assertLess(len(frame), len(serialized))
+            self.assertEqual(compression.decompress(frame), serialized.encode('utf-8'))
+            self.assertEqual(deserialize(frame), batch)
+            self.assertEqual(deserialize(memoryview(frame)), batch)
+
+        self.assertFalse(compression.is_compressed(serialized))
+        self.assertFalse(compression.is_compressed(serialized.encode('utf-8')))
+        self.assertRaises(ValueError, compression.compress, serialized, 'snappy')
+
+    def test_serialize_into(self):
+        batch = make_batch(5)
+        buffer = bytearray()
+        n = batch.serialize_into(buffer, codec=compression.ZLIB)
+        self.assertEqual(n, len(buffer))
+        self.assertEqual(deserialize(buffer), batch)
+
+    def test_dictionary(self):
+        msg = Message().push_event(FileNotification('/data/incoming/file.csv', 1000))
+        serialized = msg.serialize()
+        with_dict = compression.compress(serialized)
+        without_dict = compression.compress(serialized, dictionary=None)
+        self.assertLess(len(with_dict), len(without_dict))
+        self.assertEqual(deserialize(without_dict), msg)
+
+        # new classes don't change the default dictionary
+        class NewEvent(EventBase):
+            def __init__(self, someField=None):
+                super().__init__(someField)
+                self.someField = someField
+
+        self.assertEqual(with_dict, compression.compress(serialized))
+        self.assertEqual(deserialize(with_dict), msg)
+
+        unknown = bytearray(with_dict)
+        unknown[4:8] = b'\x00\x00\x00\x01'
+        self.assertRaises(ValueError, compression.decompress, bytes(unknown))
+
+        # a custom dictionary has to be registered by the receiver
+        zdict = compression.build_dictionary([NewEvent])
+        custom = compression.compress(NewEvent('value').serialize(), dictionary=zdict)
+        compression._dictionaries.pop(compression.register_dictionary(zdict))
+        self.assertRaises(ValueError, compression.decompress, custom)
+        compression.register_dictionary(zdict)
+        self.assertEqual(NewEvent('value').someField, deserialize(custom).someField)
+
+    def test_decode_in_other_process(self):
+        batch = make_batch(3)
+        frame = compression.compress(batch.serialize())
+
+        # the receiver only imports events and message, the sender has more
+        # classes registered, including ones defined inside tests
+        code = ('import sys, compression, events, message\n'
+                'from serializable import deserialize\n'
+                'batch = deserialize(bytes.fromhex(sys.stdin.read()))\n'
+                'print(batch.messages[-1].last_event().fileID)\n')
+        root = os.path.dirname(os.path.abspath(events.__file__))
+        env = dict(os.environ, PYTHONPATH=root)
+        result = subprocess.run([sys.executable, '-c', code], input=frame.hex(),
+                                capture_output=True, text=True, env=env, cwd=root)
+        self.assertEqual('', result.stderr)
+        self.assertEqual('2', result.stdout.strip())
+
+    def test_stream(self):
+        batch = make_batch(50)
+        for codec in (compression.ZLIB, compression.LZMA, compression.BZ2):
+            f = io.BytesIO()
+            writer = compression.CompressedWriter(f, codec)
+            for i, msg in enumerate(batch):
+                writer.write(msg)
+                if i == 10:
+                    writer.flush()
+            writer.close()
+
+            f.seek(0)
+            result = list(compression.CompressedReader(f, chunk_size=64))
+            self.assertEqual(result, batch.messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
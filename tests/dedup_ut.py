@@ -0,0 +1,126 @@
+import unittest
+import threading
+import time
+from unittest import mock
+from dedup import DuplicateDetector, fingerprint
+from event_base import EventBase
+from message import Message
+from serializable import deserialize
+
+
+class TestDuplicateDetector(unittest.TestCase):
+
+    def test_basic(self):
+        class Event1(EventBase):
+            pass
+
+        detector = DuplicateDetector()
+        msg = Message().push_event(Event1())
+        self.assertFalse(detector.is_duplicate(msg))
+        self.assertTrue(msg in detector)
+
+        # a redelivered copy has the same id
+        copy = deserialize(msg.serialize())
+        self.assertTrue(detector.is_duplicate(copy))
+        self.assertFalse(detector.is_duplicate(Message()))
+        self.assertEqual({'hits': 1, 'misses': 2, 'evictions': 0}, detector.stats())
+        self.assertEqual(2, len(detector))
+
+        detector.clear()
+        self.assertFalse(msg in detector)
+
+        self.assertRaises(ValueError, DuplicateDetector, 0)
+        self.assertRaises(ValueError, DuplicateDetector, 10, 1, False, True)
+
+    def test_lru_eviction(self):
+        detector = DuplicateDetector(max_size=2)
+        m1, m2, m3 = Message(), Message(), Message()
+        detector.is_duplicate(m1)
+        detector.is_duplicate(m2)
+        # touch m1 so that m2 is the least recently seen
+        self.assertTrue(detector.is_duplicate(m1))
+        detector.is_duplicate(m3)
+
+        self.assertTrue(m1 in detector)
+        self.assertFalse(m2 in detector)
+        self.assertTrue(m3 in detector)
+        self.assertEqual(1, detector.stats()['evictions'])
+
+    def test_ttl(self):
+        detector = DuplicateDetector(ttl=0.05)
+        msg = Message()
+        detector.is_duplicate(msg)
+        self.assertTrue(detector.is_duplicate(msg))
+        time.sleep(0.1)
+        self.assertFalse(detector.is_duplicate(msg))
+        self.assertEqual(1, detector.stats()['evictions'])
+
+    def test_fingerprint(self):
+        class Event1(EventBase):
+            pass
+
+        class Event2(EventBase):
+            pass
+
+        detector = DuplicateDetector(use_fingerprint=True)
+        msg = Message().push_event(Event1())
+        self.assertFalse(detector.is_duplicate(msg))
+        self.assertTrue(detector.is_duplicate(deserialize(msg.serialize())))
+
+        # same id, but it moved on to the next stage
+        msg.push_event(Event2())
+        self.assertFalse(detector.is_duplicate(msg))
+
+    def test_given_fingerprint(self):
+        class Event1(EventBase):
+            pass
+
+        detector = DuplicateDetector(use_fingerprint=True)
+        msg = Message().push_event(Event1())
+        serialized = msg.serialize()
+        digest = fingerprint(serialized)
+        self.assertEqual(fingerprint(msg), digest)
+
+        with mock.patch.object(Message, 'serialize') as serialize:
+            self.assertFalse(detector.seen(msg, digest))
+            self.assertFalse(detector.is_duplicate(msg, digest))
+            self.assertTrue(detector.is_duplicate(msg, digest))
+            serialize.assert_not_called()
+        self.assertTrue(msg in detector)
+
+    def test_probabilistic(self):
+        detector = DuplicateDetector(max_size=100, probabilistic=True, error_rate=0.0001)
+        messages = [Message() for _ in range(250)]
+        # fixed ids so false positives can't make the test flaky
+        for i, msg in enumerate(messages):
+            msg.id = 'msg-{}'.format(i)
+        for msg in messages:
+            self.assertFalse(detector.is_duplicate(msg))
+
+        # the most recent window is always remembered
+        for msg in messages[-100:]:
+            self.assertTrue(msg in detector)
+            self.assertTrue(detector.is_duplicate(msg))
+        self.assertEqual(100, detector.stats()['evictions'])
+
+    def test_threads(self):
+        detector = DuplicateDetector(max_size=1000)
+        messages = [Message() for _ in range(500)]
+        duplicates = []
+
+        def worker():
+            duplicates.append(sum(detector.is_duplicate(m) for m in messages))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # each message is new exactly once across all threads
+        self.assertEqual(3 * 500, sum(duplicates))
+        self.assertEqual({'hits': 1500, 'misses': 500, 'evictions': 0}, detector.stats())
+
+
+if __name__ == "__main__":
+    unittest.main()
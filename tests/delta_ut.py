@@ -0,0 +1,121 @@
+import unittest
+from delta import (DeltaReceiver, DeltaSender, MessageCache, MissingBaseError,
+                   apply_delta, encode_delta)
+from event_base import EventBase
+from events import FileNotification, IntegrityComplete
+from message import Message, RetentionPolicy
+from serializable import deserialize
+
+
+class Hop(EventBase):
+    def __init__(self, n=None):
+        super().__init__(n)
+        self.n = n
+
+
+class TestDelta(unittest.TestCase):
+
+    def test_encode_apply(self):
+        msg = Message().push_event(Hop(0)).push_event(Hop(1))
+        base = deserialize(msg.serialize())
+        msg.push_event(Hop(2))
+
+        delta = deserialize(encode_delta(msg, 2))
+        self.assertEqual(1, len(delta.events))
+        rebuilt = apply_delta(base, delta)
+        self.assertEqual(msg, rebuilt)
+        # the base is left untouched
+        self.assertEqual(2, base.count())
+
+        self.assertRaises(ValueError, encode_delta, msg, 4)
+        self.assertRaises(MissingBaseError, apply_delta, None, delta)
+
+        # diverged history
+        other = deserialize(msg.serialize())
+        other.events[1] = Hop(1)
+        self.assertRaises(MissingBaseError, apply_delta, other, delta)
+
+    def test_pipeline(self):
+        sender = DeltaSender()
+        receiver = DeltaReceiver(MessageCache())
+
+        msg = Message()
+        sizes = []
+        for i in range(20):
+            msg.push_event(Hop(i))
+            payload = sender.encode(msg)
+            sizes.append(len(payload))
+            received = receiver.decode(payload)
+            self.assertEqual(msg, received)
+            self.assertEqual(i + 1, received.count())
+
+        # after the first full transfer, per hop bytes don't grow with history
+        self.assertLess(max(sizes[1:]) - min(sizes[1:]), 10)
+        self.assertLess(sizes[-1], len(msg.serialize()) / 5)
+
+    def test_event_mutated_after_send(self):
+        sender = DeltaSender()
+        receiver = DeltaReceiver()
+
+        msg = Message().push_event(FileNotification('/a', 0))
+        receiver.decode(sender.encode(msg))
+
+        msg.last_event().mark_end_timestamp()
+        msg.last_event().inputPath = '/b'
+        msg.push_event(IntegrityComplete('/clean/b', None, 0))
+        payload = sender.encode(msg)
+        # the history changed, so it's not a delta
+        self.assertTrue(isinstance(deserialize(payload), Message))
+        got = receiver.decode(payload)
+        self.assertEqual(msg, got)
+        self.assertEqual('/b', got.events[0].inputPath)
+
+        # a receiver whose copy is outdated rejects a delta against it
+        stale = deserialize(msg.serialize())
+        stale.events[0].inputPath = '/a'
+        msg.push_event(Hop(2))
+        self.assertRaises(MissingBaseError, apply_delta, stale, deserialize(encode_delta(msg, 2)))
+
+    def test_missing_base(self):
+        sender = DeltaSender()
+        cache = MessageCache()
+        receiver = DeltaReceiver(cache)
+
+        msg = Message().push_event(Hop(0))
+        receiver.decode(sender.encode(msg))
+        cache.discard(msg.id)
+
+        msg.push_event(Hop(1))
+        with self.assertRaises(MissingBaseError) as e:
+            receiver.decode(sender.encode(msg))
+        sender.forget(e.exception.msg_id)
+
+        # falls back to a full transfer
+        payload = sender.encode(msg)
+        self.assertTrue(isinstance(deserialize(payload), Message))
+        self.assertEqual(msg, receiver.decode(payload))
+
+    def test_retention_sent_in_full(self):
+        sender = DeltaSender()
+        receiver = DeltaReceiver()
+        msg = Message(RetentionPolicy(max_events=2))
+        for i in range(4):
+            msg.push_event(Hop(i))
+            payload = sender.encode(msg)
+            self.assertTrue(isinstance(deserialize(payload), Message))
+            self.assertEqual(msg, receiver.decode(payload))
+
+    def test_cache_eviction(self):
+        cache = MessageCache(max_size=2)
+        m1, m2, m3 = Message(), Message(), Message()
+        cache.put(m1)
+        cache.put(m2)
+        cache.get(m1.id)
+        cache.put(m3)
+        self.assertTrue(m1.id in cache)
+        self.assertFalse(m2.id in cache)
+        self.assertEqual(2, len(cache))
+
+
+if __name__ == "__main__":
+    unittest.main()
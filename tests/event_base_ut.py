@@ -1,4 +1,5 @@
 import unittest
+import event_base
 from event_base import EventBase
 from serializable import deserialize
 import time
@@ -122,6 +123,44 @@ class TestEventBase(unittest.TestCase):
         event.mark_begin_timestamp()
         self.assertRaises(ValueError, event.serialize)
 
+    def test_dirty_tracking(self):
+        class MyEventType(EventBase):
+            def __init__(self, c):
+                super().__init__(c)
+                self.c = c
+
+        event = MyEventType('c')
+        self.assertTrue(event.is_dirty())
+        event.serialize()
+        self.assertFalse(event.is_dirty())
+
+        event.mark_begin_timestamp()
+        self.assertTrue(event.is_dirty())
+        event.mark_end_timestamp()
+        event.serialize()
+        self.assertFalse(event.is_dirty())
+
+        event.mark_end_timestamp()
+        self.assertTrue(event.is_dirty())
+        event.serialize()
+
+        event.c = 'd'
+        self.assertTrue(event.is_dirty())
+        event.serialize()
+
+        del event.c
+        self.assertTrue(event.is_dirty())
+
+        obj = deserialize(event.serialize())
+        self.assertTrue(obj.is_dirty())
+        self.assertNotIn('c', obj.to_dict())
+
+        # validated events are forgotten once they are gone
+        key = id(event)
+        self.assertIn(key, event_base._validated)
+        del event
+        self.assertNotIn(key, event_base._validated)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from unittest import mock
+import loadgen
+from events import FileNotification, IntegrityComplete
+from serializable import deserialize
+
+
+class TestLoadgen(unittest.TestCase):
+
+    def test_generator(self):
+        mix = loadgen.parse_mix('FileNotification=3,IntegrityComplete')
+        self.assertEqual({FileNotification: 3.0, IntegrityComplete: 1.0}, mix)
+        self.assertRaises(ValueError, loadgen.parse_mix, 'NoSuchEvent=1')
+        self.assertIn('AckComplete', loadgen.event_klasses())
+
+        generator = loadgen.Generator(mix, depth=7, path_length=4, seed=1)
+        msg = generator.message()
+        self.assertEqual(7, msg.count())
+        for event in msg.events:
+            self.assertTrue(isinstance(event, (FileNotification, IntegrityComplete)))
+
+        event = generator.event(FileNotification)
+        self.assertEqual(4, event.inputPath.count('/'))
+        self.assertTrue(isinstance(event.recvMtime, float))
+
+        batch = generator.batch(3)
+        self.assertEqual(3, len(batch))
+        self.assertEqual(batch, deserialize(batch.serialize()))
+
+    def test_main(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        profile = os.path.join(tmpdir, 'out.prof')
+        allocations = os.path.join(tmpdir, 'alloc.txt')
+
+        # latencies are measured with neither profiling nor tracing on
+        overhead = []
+        real_run = loadgen.run
+
+        def run(*args):
+            overhead.append(sys.getprofile() is not None or tracemalloc.is_tracing())
+            return real_run(*args)
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), mock.patch.object(loadgen, 'run', run):
+            results = loadgen.main(['--duration', '0.01', '--depth', '3', '--batch-size', '2',
+                                    '--profile', profile, '--tracemalloc', allocations])
+        self.assertEqual([False] * len(loadgen.OPERATIONS), overhead)
+
+        self.assertEqual(loadgen.OPERATIONS, [r['operation'] for r in results])
+        for r in results:
+            self.assertGreater(r['calls'], 0)
+            self.assertLessEqual(r['p50_us'], r['p99_us'])
+        self.assertIn('deserialize', out.getvalue())
+        self.assertTrue(os.path.exists(profile))
+        self.assertTrue(os.path.exists(profile + '.txt'))
+        self.assertTrue(os.path.exists(allocations))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,8 @@
 import unittest
 from event_base import EventBase
-from message import Message, MessageBatch
+from message import Message, MessageBatch, RetentionPolicy
 from serializable import deserialize
+from unittest import mock
 import time
 
 
@@ -124,6 +125,102 @@ class TestMessage(unittest.TestCase):
         msg.get_event(Event1).bogus = 'bogusness'
         self.assertEqual(msg, obj)
 
+    def test_deserialize_projected(self):
+        class Event1(EventBase):
+            def __init__(self, n=None):
+                super().__init__(n)
+                self.n = n
+
+        class Event2(EventBase):
+            pass
+
+        msg = Message()
+        for i in range(5):
+            msg.push_event(Event1(i))
+        msg.push_event(Event2())
+
+        for serialized in (msg.serialize(), msg.serialize(preserve_refs=True)):
+            obj = Message.deserialize_projected(serialized, last=1)
+            self.assertEqual(msg.id, obj.id)
+            self.assertEqual(1, obj.count())
+            self.assertTrue(isinstance(obj.last_event(), Event2))
+            self.assertFalse(Event1 in obj)
+
+            obj = Message.deserialize_projected(serialized, last=0)
+            self.assertEqual(msg.id, obj.id)
+            self.assertEqual(0, obj.count())
+
+            obj = Message.deserialize_projected(serialized, event_types=[Event1])
+            self.assertEqual([0, 1, 2, 3, 4], [e.n for e in obj.events])
+
+            obj = Message.deserialize_projected(serialized, event_types=['Event1'], last=2)
+            self.assertEqual([3, 4], [e.n for e in obj.events])
+            self.assertEqual(msg.get_event(Event1), obj.get_event(Event1))
+
+            obj = Message.deserialize_projected(serialized, last=10)
+            self.assertEqual(msg, obj)
+
+    def test_retention_max_events(self):
+        class Event1(EventBase):
+            pass
+
+        class Event2(EventBase):
+            pass
+
+        msg = Message(RetentionPolicy(max_events=2))
+        first = Event1()
+        msg.push_event(first).push_event(Event1()).push_event(Event2())
+        last = Event1()
+        msg.push_event(last)
+
+        self.assertEqual(2, msg.count())
+        self.assertTrue(msg.last_event() is last)
+        self.assertTrue(msg.get_event(Event1) is last)
+        self.assertEqual(2, msg.dropped['Event1']['count'])
+        self.assertEqual(first.beginTimestamp, msg.dropped['Event1']['firstBeginTimestamp'])
+
+        msg.push_event(Event1())
+        self.assertEqual(None, msg.get_event(Event2))
+        self.assertFalse(Event2 in msg)
+        # dropped events are still part of the history
+        self.assertTrue(msg.has_seen(Event2))
+        self.assertTrue(msg.has_seen('Event2'))
+        self.assertTrue(msg.has_seen(Event1))
+        self.assertFalse(Message().has_seen(Event1))
+
+        obj = deserialize(msg.serialize())
+        self.assertEqual(msg, obj)
+        self.assertTrue(isinstance(obj.retention, RetentionPolicy))
+        obj.push_event(Event2())
+        self.assertEqual(2, obj.count())
+        self.assertEqual(3, obj.dropped['Event1']['count'])
+
+        self.assertRaises(ValueError, RetentionPolicy, 0)
+
+    def test_retention_latest_per_type(self):
+        class Event1(EventBase):
+            pass
+
+        class Event2(EventBase):
+            pass
+
+        msg = Message(RetentionPolicy(latest_per_type=True))
+        for _ in range(10):
+            msg.push_event(Event1()).push_event(Event2())
+
+        self.assertEqual(['Event1', 'Event2'], [e.event_type() for e in msg.events])
+        self.assertEqual(9, msg.dropped['Event1']['count'])
+        self.assertEqual(9, msg.dropped['Event2']['count'])
+
+        latest = Event1()
+        msg.push_event(latest)
+        self.assertEqual(['Event2', 'Event1'], [e.event_type() for e in msg.events])
+        self.assertTrue(msg.get_event(Event1) is latest)
+        self.assertEqual(msg, deserialize(msg.serialize()))
+
+        # no policy, no extra state
+        self.assertNotIn('dropped', Message().__dict__)
+
     def test_events_validation(self):
         class Event1(EventBase):
             def __init__(self):
@@ -138,6 +235,7 @@ class TestMessage(unittest.TestCase):
 
         # no eventType
         self.assertRaises(AssertionError, msg.serialize)
+        self.assertRaises(AssertionError, msg.serialize_into, bytearray())
 
         msg = Message()
         event = Event2()
@@ -149,6 +247,27 @@ class TestMessage(unittest.TestCase):
 
         self.assertRaises(ValueError, msg.serialize)
 
+    def test_events_validation_cached(self):
+        class Event1(EventBase):
+            pass
+
+        msg = Message()
+        event = Event1()
+        msg.push_event(event)
+
+        with mock.patch.object(Event1, '_validate_serializable',
+                               autospec=True, side_effect=EventBase._validate_serializable) as validate:
+            msg.serialize()
+            msg.serialize()
+            self.assertEqual(1, validate.call_count)
+
+            event.mark_end_timestamp()
+            msg.serialize()
+            self.assertEqual(2, validate.call_count)
+
+        event.beginTimestamp = event.endTimestamp + 1
+        self.assertRaises(ValueError, msg.serialize)
+
     def test_message_batch_deserialize(self):
         class Event1(EventBase):
             pass
@@ -182,5 +301,27 @@ class TestMessage(unittest.TestCase):
         self.assertEqual('Event3', instance_dict['messages'][-1]['events'][-1]['eventType'])
         self.assertEqual(batch, obj)
 
+    def test_message_batch_preserve_refs(self):
+        class Event1(EventBase):
+            def __init__(self, path=None):
+                super().__init__(path)
+                self.path = path
+
+        shared = Event1('/some/shared/path')
+        batch = MessageBatch()
+        for _ in range(3):
+            batch.push_back(Message().push_event(shared))
+
+        serialized = batch.serialize(preserve_refs=True)
+        self.assertLess(len(serialized), len(batch.serialize()))
+
+        obj = deserialize(serialized)
+        self.assertTrue(isinstance(obj, MessageBatch))
+        self.assertEqual(batch, obj)
+        first = obj.messages[0].last_event()
+        self.assertTrue(isinstance(first, Event1))
+        self.assertTrue(all(m.last_event() is first for m in obj))
+        self.assertNotIn('$id', first.__dict__)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock
+from events import FileNotification, IntegrityComplete
+from message import Message, MessageBatch
+from partition import (HashRing, PartitionedConsumer, Partitioner, consume_partitioned,
+                       event_field_key, stable_hash)
+
+
+def handle(msg):
+    return (os.getpid(), msg.get_event(FileNotification).inputPath,
+            msg.last_event().fileID)
+
+
+def make_batch(files, per_file):
+    batch = MessageBatch()
+    for seq in range(per_file):
+        for f in range(files):
+            msg = Message()
+            msg.push_event(FileNotification('/in/file{}.csv'.format(f), 0))
+            msg.push_event(IntegrityComplete('/clean/file{}.csv'.format(f), None, seq))
+            batch.push_back(msg)
+    return batch
+
+
+class TestPartition(unittest.TestCase):
+
+    def test_split(self):
+        batch = make_batch(files=10, per_file=5)
+        partitioner = Partitioner(4, event_field_key(FileNotification, 'inputPath'))
+        parts = partitioner.split(batch)
+
+        self.assertEqual(4, len(parts))
+        self.assertEqual(len(batch), sum(len(p) for p in parts))
+        seen = {}
+        for i, part in enumerate(parts):
+            for msg in part:
+                path = msg.get_event(FileNotification).inputPath
+                # every key lives in exactly one partition
+                self.assertEqual(i, seen.setdefault(path, i))
+            # arrival order is kept within a partition
+            for path in set(m.get_event(FileNotification).inputPath for m in part):
+                seqs = [m.last_event().fileID for m in part
+                        if m.get_event(FileNotification).inputPath == path]
+                self.assertEqual(list(range(5)), seqs)
+
+        # messages without the key event are keyed by id
+        msg = Message()
+        self.assertEqual(msg.id, event_field_key(FileNotification, 'inputPath')(msg))
+        self.assertEqual(stable_hash('a'), stable_hash('a'))
+        self.assertRaises(ValueError, Partitioner, 0, str)
+
+    def test_consistent_hashing(self):
+        keys = ['/in/file{}.csv'.format(i) for i in range(2000)]
+        ring4 = HashRing(4)
+        ring5 = HashRing(5)
+        moved = sum(ring4(k) != ring5(k) for k in keys)
+        # ideally 1/5 of the keys move, modulo hashing moves most of them
+        self.assertLess(moved, len(keys) * 0.3)
+        self.assertEqual(set(range(4)), set(ring4(k) for k in keys))
+
+        partitioner = Partitioner(4, event_field_key(FileNotification, 'inputPath'), consistent=True)
+        batch = make_batch(files=10, per_file=2)
+        self.assertEqual(len(batch), sum(len(p) for p in partitioner.split(batch)))
+
+    def test_consume_partitioned(self):
+        batch = make_batch(files=8, per_file=3)
+        partitioner = Partitioner(3, event_field_key(FileNotification, 'inputPath'))
+        results = consume_partitioned(batch, partitioner, handle)
+
+        self.assertEqual(3, len(results))
+        self.assertEqual(len(batch), sum(len(r) for r in results))
+        for part in results:
+            for path in set(r[1] for r in part):
+                handled = [r for r in part if r[1] == path]
+                # one process handles a key, in order
+                self.assertEqual(1, len(set(r[0] for r in handled)))
+                self.assertEqual([0, 1, 2], [r[2] for r in handled])
+
+    def test_partitioned_consumer(self):
+        partitioner = Partitioner(3, event_field_key(FileNotification, 'inputPath'))
+        with mock.patch('partition.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            with PartitionedConsumer(partitioner, handle) as consumer:
+                for _ in range(3):
+                    results = consumer.consume(make_batch(files=8, per_file=2))
+                    self.assertEqual(16, sum(len(r) for r in results))
+        # the same pool serves every batch, and is shut down on exit
+        self.assertEqual(1, pool.call_count)
+        self.assertRaises(RuntimeError, consumer.executor.submit, handle, None)
+
+    def test_empty_partitions(self):
+        partitioner = Partitioner(4, event_field_key(FileNotification, 'inputPath'))
+        batch = make_batch(files=1, per_file=3)
+        with ThreadPoolExecutor(2) as pool:
+            executor = mock.Mock(wraps=pool)
+            results = consume_partitioned(batch, partitioner, handle, executor)
+        self.assertEqual(1, executor.submit.call_count)
+        self.assertEqual([0, 0, 0, 3], sorted(len(r) for r in results))
+        self.assertEqual([], consume_partitioned(MessageBatch(), partitioner, handle, executor)[0])
+        self.assertEqual(1, executor.submit.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,11 @@
 import unittest
+import serializable
 from serializable import Serializable, deserialize
 import json
+import os
+import shutil
+import sys
+import tempfile
 
 
 class TestSerializable(unittest.TestCase):
@@ -204,6 +209,41 @@ class TestSerializable(unittest.TestCase):
         bad_data = {'klass': 'UNKNOWN'}
         self.assertRaises(ValueError, deserialize, json.dumps(bad_data))
 
+    def test_bytes_input(self):
+        class TestMessage(Serializable):
+            def __init__(self, a, b):
+                super().__init__(a, b)
+                self.a = a
+                self.b = b
+
+        test = TestMessage('a', ['b', 'ü'])
+        encoded = test.serialize().encode('utf-8')
+
+        for serialized in (encoded, bytearray(encoded), memoryview(encoded)):
+            self.assertEqual(deserialize(serialized), test)
+            self.assertEqual(TestMessage.deserialize(serialized), test)
+
+    def test_serialize_into(self):
+        class TestMessage(Serializable):
+            def __init__(self, a):
+                super().__init__(a)
+                self.a = a
+
+        first = TestMessage('first')
+        second = TestMessage('ü')
+
+        buffer = bytearray()
+        n = first.serialize_into(buffer)
+        self.assertEqual(n, len(buffer))
+        self.assertEqual(bytes(buffer), first.serialize().encode('utf-8'))
+
+        m = second.serialize_into(buffer)
+        self.assertEqual(n + m, len(buffer))
+        view = memoryview(buffer)
+        self.assertEqual(deserialize(view[:n]), first)
+        self.assertEqual(deserialize(view[n:]), second)
+        view.release()
+
     def test_nested_deserialize(self):
         class Child(Serializable):
             def __init__(self, c):
@@ -339,6 +379,146 @@ class TestSerializable(unittest.TestCase):
         self.assertTrue(isinstance(obj.p.followers[-1], Child))
         self.assertEqual(obj, parent2)
 
+    def test_preserve_refs(self):
+        class Child(Serializable):
+            def __init__(self, c):
+                super().__init__(c)
+                self.c = c
+                self.parent = None
+
+        class Parent(Serializable):
+            def __init__(self, p):
+                super().__init__(p)
+                self.p = p
+                self.children = []
+                self.favorite = None
+
+        parent = Parent('p')
+        child = Child('c')
+        child.parent = parent
+        parent.children.append(child)
+        parent.children.append(child)
+        parent.favorite = child
+
+        # cyclic references can only be serialized when preserving refs
+        self.assertRaises(RecursionError, parent.serialize)
+
+        obj = deserialize(parent.serialize(preserve_refs=True))
+        self.assertTrue(isinstance(obj, Parent))
+        self.assertTrue(isinstance(obj.favorite, Child))
+        self.assertTrue(obj.children[0] is obj.children[1])
+        self.assertTrue(obj.favorite is obj.children[0])
+        self.assertTrue(obj.favorite.parent is obj)
+        self.assertEqual(obj.favorite.c, 'c')
+
+    def test_preserve_refs_plain_dicts(self):
+        class Child(Serializable):
+            def __init__(self, c):
+                super().__init__(c)
+                self.c = c
+
+        class Parent(Serializable):
+            def __init__(self, p):
+                super().__init__(p)
+                self.p = p
+                self.lookup = {}
+                self.nested = []
+                self.child = None
+
+        # '$ref' is an ordinary key without preserve_refs
+        parent = Parent({'$ref': '#/definitions/x'})
+        self.assertEqual(parent, deserialize(parent.serialize()))
+        # and user keys can't be mistaken for back-references with it
+        parent.lookup = {'$ref': 'x', '$id': 0, '$$other': 1, 'key': 2}
+        parent.nested = [{'$ref': 0}]
+        self.assertEqual(parent, deserialize(parent.serialize(preserve_refs=True)))
+
+        # objects inside plain dicts and nested lists aren't revived, so
+        # later occurrences can't refer back to them
+        child = Child('c')
+        parent = Parent('p')
+        parent.lookup['c'] = child
+        parent.nested.append([child])
+        parent.child = child
+        obj = deserialize(parent.serialize(preserve_refs=True))
+        self.assertTrue(isinstance(obj.child, Child))
+        self.assertEqual('c', obj.child.c)
+        self.assertEqual('c', obj.lookup['c']['c'])
+        self.assertEqual('c', obj.nested[0][0]['c'])
+
+    def _make_modules(self, modules):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        sys.path.insert(0, tmpdir)
+        self.addCleanup(sys.path.remove, tmpdir)
+        for name, source in modules.items():
+            with open(os.path.join(tmpdir, name + '.py'), 'w') as f:
+                f.write(source)
+            self.addCleanup(sys.modules.pop, name, None)
+        # classes registered or declared by the test modules must not leak
+        # into other tests
+        for registry in (serializable.klass_registry, serializable._declared_klasses):
+            self.addCleanup(self._restore, registry, dict(registry))
+        return tmpdir
+
+    @staticmethod
+    def _restore(registry, saved):
+        registry.clear()
+        registry.update(saved)
+
+    def test_lazy_registry(self):
+        tmpdir = self._make_modules({'lazy_mod': (
+            'from serializable import Serializable\n'
+            'class LazyKlass(Serializable):\n'
+            '    def __init__(self, a=None):\n'
+            '        super().__init__(a)\n'
+            '        self.a = a\n')})
+
+        serializable.declare_klass('LazyKlass', 'lazy_mod')
+        self.assertNotIn('lazy_mod', sys.modules)
+
+        obj = deserialize(json.dumps({'args': ['x'], 'kwargs': {}, 'a': 'x', 'klass': 'LazyKlass'}))
+        self.assertIn('lazy_mod', sys.modules)
+        self.assertEqual(obj.type(), 'LazyKlass')
+        self.assertEqual(obj.a, 'x')
+
+        # declaring it somewhere else is a collision
+        self.assertRaises(ValueError, serializable.declare_klass, 'LazyKlass', 'other_mod')
+        serializable.declare_klass('Missing', 'lazy_mod')
+        self.assertRaises(ValueError, deserialize, json.dumps({'klass': 'Missing'}))
+
+        path = os.path.join(tmpdir, 'manifest.json')
+        manifest = serializable.load_manifest(path, ['lazy_mod'])
+        self.assertEqual({'LazyKlass': 'lazy_mod'}, manifest)
+        self.assertTrue(os.path.exists(path))
+        # cached manifest is used as is
+        self.assertEqual(manifest, serializable.load_manifest(path, ['not_imported']))
+
+    def test_resolve_declared_klasses(self):
+        self._make_modules({
+            'good_mod': ('from serializable import Serializable\n'
+                         'class GoodKlass(Serializable):\n'
+                         '    pass\n'),
+            'broken_mod': 'raise ImportError("broken")\n'})
+        serializable.declare_klass('BrokenKlass', 'broken_mod')
+        serializable.declare_klass('GoodKlass', 'good_mod')
+        serializable.declare_klass('Missing', 'good_mod')
+
+        failed = serializable.resolve_declared_klasses()
+        self.assertEqual({'BrokenKlass', 'Missing'}, set(failed))
+        self.assertTrue(isinstance(failed['BrokenKlass'], ImportError))
+        self.assertIn('GoodKlass', serializable.klass_registry)
+
+    def test_name_collision(self):
+        source = ('from serializable import Serializable\n'
+                  'class CollidingKlass(Serializable):\n'
+                  '    pass\n')
+        self._make_modules({'collision_a': source, 'collision_b': source})
+
+        import collision_a
+        self.assertRaises(ValueError, __import__, 'collision_b')
+        self.assertTrue(serializable.klass_registry['CollidingKlass'] is collision_a.CollidingKlass)
+
 
 if __name__ == "__main__":
     unittest.main()
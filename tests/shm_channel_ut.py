@@ -0,0 +1,137 @@
+import unittest
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import threading
+from events import FileNotification
+from message import Message, MessageBatch
+from shm_channel import SharedMemoryChannel
+
+
+def consume(channel, count, results):
+    for _ in range(count):
+        msg = channel.recv(timeout=10)
+        results.put(msg.get_event(FileNotification).inputPath)
+    channel.close()
+
+
+def produce(channel, count, prefix):
+    for i in range(count):
+        channel.send(Message().push_event(FileNotification('{}{}'.format(prefix, i), i)), timeout=10)
+    channel.close()
+
+
+class TestSharedMemoryChannel(unittest.TestCase):
+
+    def make_channel(self, *args):
+        channel = SharedMemoryChannel(*args)
+        self.addCleanup(channel.unlink)
+        self.addCleanup(channel.close)
+        return channel
+
+    def test_send_recv(self):
+        channel = self.make_channel(4, 4096)
+        batch = MessageBatch()
+        batch.push_back(Message().push_event(FileNotification('/in/a.csv', 1)))
+        channel.send(batch)
+        channel.send(batch.serialize().encode('utf-8'))
+
+        self.assertEqual(batch, channel.recv())
+        self.assertEqual(batch, channel.recv_nowait())
+        self.assertRaises(queue.Empty, channel.recv_nowait)
+        self.assertRaises(queue.Empty, channel.recv, True, 0.01)
+        self.assertRaises(ValueError, channel.send, b'x' * 4097)
+        self.assertRaises(ValueError, SharedMemoryChannel, 0)
+
+    def test_full_and_reclaim(self):
+        channel = self.make_channel(2, 1024)
+        msg = Message()
+        channel.send(msg)
+        channel.send(msg)
+        self.assertRaises(queue.Full, channel.send, msg, False)
+
+        first, view1 = channel.recv_raw()
+        second, view2 = channel.recv_raw()
+        view2.release()
+        channel.release(second)
+        # the oldest slot is still being read, nothing can be reused yet
+        self.assertRaises(queue.Full, channel.send, msg, True, 0.01)
+
+        view1.release()
+        channel.release(first)
+        channel.send(msg)
+        channel.send(msg)
+        self.assertEqual(msg, channel.recv())
+        self.assertEqual(msg, channel.recv())
+
+    def test_threads(self):
+        channel = self.make_channel(8, 4096)
+        producers = [threading.Thread(target=produce, args=(channel, 200, prefix))
+                     for prefix in ('/in/a', '/in/bb')]
+        # produce() closes the channel when done, keep it open here
+        channel.close = lambda: None
+        for t in producers:
+            t.start()
+        received = [channel.recv(timeout=10).get_event(FileNotification).inputPath
+                    for _ in range(400)]
+        for t in producers:
+            t.join()
+        expected = set('{}{}'.format(p, i) for p in ('/in/a', '/in/bb') for i in range(200))
+        self.assertEqual(expected, set(received))
+
+    def test_failed_send_keeps_slot(self):
+        channel = self.make_channel(1, 1024)
+        # a 2-d view fails while being copied into the slot
+        bad = memoryview(b'x' * 10).cast('B', (2, 5))
+        self.assertRaises(ValueError, channel.send, bad, False)
+        self.assertRaises(ValueError, channel.send, bad, False)
+        channel.send(Message(), block=False)
+        self.assertTrue(isinstance(channel.recv_nowait(), Message))
+
+    def test_processes(self):
+        channel = self.make_channel(8, 4096)
+        results = multiprocessing.Queue()
+        consumers = [multiprocessing.Process(target=consume, args=(channel, 50, results))
+                     for _ in range(2)]
+        producers = [multiprocessing.Process(target=produce, args=(channel, 50, prefix))
+                     for prefix in ('a', 'b')]
+        for p in consumers + producers:
+            p.start()
+        received = [results.get(timeout=10) for _ in range(100)]
+        for p in consumers + producers:
+            p.join(10)
+            self.assertEqual(0, p.exitcode)
+
+        self.assertEqual(set('{}{}'.format(p, i) for p in 'ab' for i in range(50)), set(received))
+
+    def test_spawn_cleanup(self):
+        code = ('import multiprocessing, sys\n'
+                'sys.path.insert(0, "tests")\n'
+                'from shm_channel import SharedMemoryChannel\n'
+                'from shm_channel_ut import consume\n'
+                'from message import Message\n'
+                'from events import FileNotification\n'
+                'if __name__ == "__main__":\n'
+                '    ctx = multiprocessing.get_context("spawn")\n'
+                '    channel = SharedMemoryChannel(4, 4096, ctx)\n'
+                '    results = ctx.Queue()\n'
+                '    p = ctx.Process(target=consume, args=(channel, 1, results))\n'
+                '    p.start()\n'
+                '    channel.send(Message().push_event(FileNotification("/in/a", 0)))\n'
+                '    print(results.get(timeout=10))\n'
+                '    p.join()\n'
+                '    channel.close()\n'
+                '    channel.unlink()\n')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                                text=True, env=env, cwd=root, timeout=60)
+        self.assertEqual('/in/a', result.stdout.strip())
+        # no resource tracker complaints about the segment
+        self.assertEqual('', result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()